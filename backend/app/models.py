@@ -2,7 +2,7 @@ from typing import Optional, List, Dict
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, JSON, UniqueConstraint
 
 
 class Platform(SQLModel, table=True):
@@ -13,6 +13,8 @@ class Platform(SQLModel, table=True):
      
     auth_config: Dict = Field(default_factory=dict, sa_column=Column(JSON)) 
     integrations_config: Dict = Field(default_factory=dict, sa_column=Column(JSON))
+    # e.g. {"retention_months": 12, "on_expire": "archive", "archive_format": "parquet"}
+    retention_config: Dict = Field(default_factory=dict, sa_column=Column(JSON))
      
     tickets: List["Ticket"] = Relationship(back_populates="platform")
     
@@ -55,22 +57,35 @@ class Ticket(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 # 3. TICKET MESSAGE (The "Chat History")
+# Range-partitioned by month on `timestamp` (optionally LIST sub-partitioned by
+# platform_id), see app/services/partitions.py. Postgres requires every unique
+# constraint on a partitioned table to include the partition keys, hence the
+# composite primary key and the scoped gmail_message_id constraint.
 class TicketMessage(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        UniqueConstraint("gmail_message_id", "timestamp", "platform_id"),
+        {"postgresql_partition_by": 'RANGE ("timestamp")'},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     
     ticket_id: int = Field(foreign_key="ticket.id")
     ticket: Optional[Ticket] = Relationship(back_populates="messages")
+
+    # Denormalised from Ticket so retention can be applied per platform
+    platform_id: int = Field(foreign_key="platform.id", primary_key=True)
     
     sender_type: str # "customer" or "agent"
     sender_email: str
     body: str
 
-    gmail_message_id: Optional[str] = Field(default=None, index=True, unique=True)
+    gmail_message_id: Optional[str] = Field(default=None, index=True)
     
     # AI Embedding for this specific message (for semantic search later)
     embedding: Optional[List[float]] = Field(default=None, sa_column=Column(Vector(1536))) # OpenAI uses 1536 dims
     
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Partition key: set to the email's received time so dedupe lookups can prune
+    timestamp: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
 
 # 4. TICKET CLASSIFICATION (The "AI Brain Dump")
 class TicketClassification(SQLModel, table=True):
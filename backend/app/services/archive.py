@@ -0,0 +1,140 @@
+import os
+import json
+import gzip
+import asyncio
+import tempfile
+from typing import Optional
+from datetime import datetime
+from minio import Minio
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ROOT_USER", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+ARCHIVE_BUCKET = os.getenv("MESSAGE_ARCHIVE_BUCKET", "ticket-archive")
+
+ARCHIVE_FORMATS = ("parquet", "jsonl")
+BATCH_SIZE = 5000
+
+# embedding is cast so both writers get plain float lists instead of pgvector text
+EXPORT_COLUMNS = (
+    "id, ticket_id, platform_id, sender_type, sender_email, body, "
+    'gmail_message_id, embedding::real[] AS embedding, "timestamp"'
+)
+
+
+def get_minio_client():
+    return Minio(
+        MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=MINIO_SECURE,
+    )
+
+
+class _JsonlSink:
+    def __init__(self, path: str):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, batch):
+        for row in batch:
+            self.file.write(json.dumps(row, default=_json_default) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    # Mirrors EXPORT_COLUMNS
+    return pa.schema([
+        ("id", pa.int64()),
+        ("ticket_id", pa.int64()),
+        ("platform_id", pa.int64()),
+        ("sender_type", pa.string()),
+        ("sender_email", pa.string()),
+        ("body", pa.string()),
+        ("gmail_message_id", pa.string()),
+        ("embedding", pa.list_(pa.float32())),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+
+class _ParquetSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = None
+
+    def write(self, batch):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Fixed schema: inferring per batch turns all-NULL columns into `null`
+        # and the next batch with real values no longer matches the writer
+        schema = _parquet_schema()
+        table = pa.Table.from_pylist(batch, schema=schema)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _upload(path: str, object_name: str, content_type: str):
+    client = get_minio_client()
+    if not client.bucket_exists(ARCHIVE_BUCKET):
+        client.make_bucket(ARCHIVE_BUCKET)
+    client.fput_object(ARCHIVE_BUCKET, object_name, path, content_type=content_type)
+
+
+async def archive_partition(conn, partition: str, object_prefix: str, archive_format: str = "parquet") -> Optional[str]:
+    """
+    Streams every row of a TicketMessage partition into a compressed
+    Parquet (zstd) or JSONL (gzip) file and uploads it to MinIO.
+    Returns the object name (None if the partition was empty).
+    Raises on failure so the caller keeps the partition.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {archive_format}")
+
+    if archive_format == "parquet":
+        suffix, content_type, sink_cls = ".parquet", "application/vnd.apache.parquet", _ParquetSink
+    else:
+        suffix, content_type, sink_cls = ".jsonl.gz", "application/gzip", _JsonlSink
+
+    object_name = f"{object_prefix}{suffix}"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"{partition}{suffix}")
+        sink = sink_cls(path)
+        rows = 0
+        try:
+            result = await conn.stream(text(f'SELECT {EXPORT_COLUMNS} FROM "{partition}" ORDER BY id'))
+            async for chunk in result.mappings().partitions(BATCH_SIZE):
+                batch = [dict(row) for row in chunk]
+                await asyncio.to_thread(sink.write, batch)
+                rows += len(batch)
+        finally:
+            sink.close()
+
+        if rows:
+            await asyncio.to_thread(_upload, path, object_name, content_type)
+
+    if not rows:
+        print(f"📭 {partition} is empty, nothing to archive.")
+        return None
+
+    print(f"📦 Archived {rows} rows from {partition} to s3://{ARCHIVE_BUCKET}/{object_name}")
+    return object_name
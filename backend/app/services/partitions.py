@@ -0,0 +1,346 @@
+import os
+import re
+import asyncio
+from typing import Optional, List, Dict
+from datetime import datetime
+from sqlalchemy import text, select
+from dotenv import load_dotenv
+from app.models import Platform, TicketMessage
+from app.services.archive import archive_partition, ARCHIVE_FORMATS
+
+load_dotenv()
+
+PARENT_TABLE = TicketMessage.__tablename__
+
+# How many months ahead of the current one to pre-create
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+# LIST sub-partition each month by platform_id. Needed for per-platform retention:
+# flat months are shared, so they are kept until every platform's policy expires them
+PARTITION_BY_PLATFORM = os.getenv("MESSAGE_PARTITION_BY_PLATFORM", "false").lower() == "true"
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", "86400"))
+
+# Defaults for platforms without their own Platform.retention_config
+_retention_env = os.getenv("MESSAGE_RETENTION_MONTHS", "").strip()
+# None = keep forever; anything non-numeric is left as-is for retention_policy to reject
+DEFAULT_RETENTION_MONTHS = (
+    int(_retention_env) if _retention_env.lstrip("-").isdigit() else (_retention_env or None)
+)
+DEFAULT_ON_EXPIRE = os.getenv("MESSAGE_RETENTION_ACTION", "archive")  # "archive" or "drop"
+DEFAULT_ARCHIVE_FORMAT = os.getenv("MESSAGE_ARCHIVE_FORMAT", "parquet")  # "parquet" or "jsonl"
+
+# {table}_y2026m01 (month), {table}_y2026m01_p3 / {table}_y2026m01_default (platform leaves)
+PARTITION_RE = re.compile(rf"^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})(?:_(p\d+|default))?$")
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + (dt.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_partition_name(month: datetime) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+ON_EXPIRE_ACTIONS = ("archive", "drop")
+
+
+def retention_policy(config: Optional[Dict] = None, source: str = "defaults") -> Dict:
+    """
+    Merges a Platform.retention_config with the env defaults, e.g.
+    {"retention_months": 12, "on_expire": "archive", "archive_format": "parquet"}
+    Anything invalid turns into a keep-forever policy, so a typo never drops data.
+    """
+    config = config or {}
+    policy = {
+        "retention_months": config.get("retention_months", DEFAULT_RETENTION_MONTHS),
+        "on_expire": config.get("on_expire", DEFAULT_ON_EXPIRE),
+        "archive_format": config.get("archive_format", DEFAULT_ARCHIVE_FORMAT),
+    }
+
+    months = policy["retention_months"]
+    if months is not None and (not isinstance(months, int) or isinstance(months, bool) or months < 0):
+        print(f"⚠️ Invalid retention_months {months!r} ({source}), keeping data.")
+        policy["retention_months"] = None
+    if policy["on_expire"] not in ON_EXPIRE_ACTIONS:
+        print(f"⚠️ Invalid on_expire {policy['on_expire']!r} ({source}), keeping data.")
+        policy["retention_months"] = None
+    if policy["on_expire"] == "archive" and policy["archive_format"] not in ARCHIVE_FORMATS:
+        print(f"⚠️ Invalid archive_format {policy['archive_format']!r} ({source}), keeping data.")
+        policy["retention_months"] = None
+    return policy
+
+
+def is_expired(month: datetime, policy: Dict, now: datetime) -> bool:
+    """A month expires once it falls outside the current month + `retention_months` before it."""
+    if policy["retention_months"] is None:
+        return False
+    return month < add_months(month_start(now), -policy["retention_months"])
+
+
+async def _children(conn, parent: str) -> Dict[str, str]:
+    """Returns {partition_name: relkind} ('p' = itself partitioned, 'r' = leaf)."""
+    result = await conn.execute(text("""
+        SELECT c.relname, c.relkind::text AS relkind
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :parent
+    """), {"parent": parent})
+    return {row.relname: row.relkind for row in result}
+
+
+async def is_partitioned(conn) -> bool:
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE relname = :name"), {"name": PARENT_TABLE}
+    )
+    return result.scalar() == "p"
+
+
+async def _create_platform_partition(conn, month_name: str, platform_id: int):
+    """
+    Creates a platform's leaf, moving in any rows the month's _default leaf took
+    before it existed (Postgres refuses the attach while _default still holds them).
+    """
+    leaf = f"{month_name}_p{int(platform_id)}"
+    await conn.execute(text(f'CREATE TABLE "{leaf}" (LIKE "{month_name}" INCLUDING DEFAULTS)'))
+    await conn.execute(text(
+        f'WITH moved AS (DELETE FROM "{month_name}_default" WHERE platform_id = {int(platform_id)} RETURNING *) '
+        f'INSERT INTO "{leaf}" SELECT * FROM moved'
+    ))
+    await conn.execute(text(f'ALTER TABLE "{month_name}" ATTACH PARTITION "{leaf}" FOR VALUES IN ({int(platform_id)})'))
+
+
+async def ensure_month_partition(engine, month: datetime, platform_ids: List[int]):
+    name = month_partition_name(month)
+    async with engine.begin() as conn:
+        existing = await _children(conn, PARENT_TABLE)
+        if name not in existing:
+            sub = " PARTITION BY LIST (platform_id)" if PARTITION_BY_PLATFORM else ""
+            await conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}'){sub}"
+            ))
+            print(f"🗂️ Created partition {name}")
+            subpartitioned = PARTITION_BY_PLATFORM
+        else:
+            # Respect how the month was originally created, even if the flag changed since
+            subpartitioned = existing[name] == "p"
+
+        if not subpartitioned:
+            return
+        await conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}_default" PARTITION OF "{name}" DEFAULT'))
+        leaves = await _children(conn, name)
+
+    # One transaction per leaf so a single failure doesn't hold back the others.
+    # New platforms are only picked up here; until then their rows sit in _default.
+    for platform_id in platform_ids:
+        if f"{name}_p{platform_id}" in leaves:
+            continue
+        try:
+            async with engine.begin() as conn:
+                await _create_platform_partition(conn, name, platform_id)
+        except Exception as e:
+            print(f"❌ Could not create {name}_p{platform_id}: {e}")
+
+
+async def create_future_partitions(engine, now: Optional[datetime] = None):
+    """
+    Makes sure the current month and the next PARTITION_PREMAKE_MONTHS exist.
+    There is deliberately no top-level DEFAULT partition: an insert outside the
+    pre-created months fails loudly instead of hiding rows from retention.
+    """
+    now = now or datetime.utcnow()
+    async with engine.begin() as conn:
+        platform_ids = (await conn.execute(text("SELECT id FROM platform"))).scalars().all()
+
+    for offset in range(PARTITION_PREMAKE_MONTHS + 1):
+        month = add_months(month_start(now), offset)
+        try:
+            await ensure_month_partition(engine, month, platform_ids)
+        except Exception as e:
+            print(f"❌ Could not create partition for {month:%Y-%m}: {e}")
+
+
+async def _archive_and_drop(engine, name: str, policy: Dict, object_prefix: str) -> bool:
+    """
+    Archives (if requested) and drops an already detached partition. On failure it
+    stays detached and _retry_detached picks it up on the next cycle.
+    """
+    try:
+        if policy["on_expire"] == "archive":
+            async with engine.begin() as conn:
+                await archive_partition(conn, name, object_prefix, policy["archive_format"])
+        async with engine.begin() as conn:
+            await conn.execute(text(f'DROP TABLE "{name}"'))
+    except Exception as e:
+        print(f"⚠️ Could not archive/drop {name}, left detached for the next cycle: {e}")
+        return False
+    print(f"🗑️ Dropped expired partition {name}")
+    return True
+
+
+async def _expire_partition(engine, parent: str, name: str, policy: Dict, object_prefix: str) -> bool:
+    """Detaches one partition first, so no insert can slip in between the export and the drop."""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f'ALTER TABLE "{parent}" DETACH PARTITION "{name}"'))
+    except Exception as e:
+        print(f"❌ Retention failed for {name}, could not detach it: {e}")
+        return False
+    return await _archive_and_drop(engine, name, policy, object_prefix)
+
+
+def _shared_policy(month: datetime, policies: List[Dict], now: datetime) -> Optional[Dict]:
+    """
+    Policy for a partition that mixes platforms (a flat month or a month's _default
+    leaf): it only expires once every platform's policy expires it, and is archived
+    if any of them asks for an archive. Returns None while it must be kept.
+    """
+    if not policies or not all(is_expired(month, p, now) for p in policies):
+        return None
+    archiving = [p for p in policies if p["on_expire"] == "archive"]
+    if archiving:
+        return {"on_expire": "archive", "archive_format": archiving[0]["archive_format"]}
+    return {"on_expire": "drop", "archive_format": None}
+
+
+def _partition_policy(match, policies: Dict[int, Dict], now: datetime):
+    """
+    For a PARTITION_RE match returns (month, policy, object_prefix), with policy
+    None while the partition must be kept.
+    """
+    month = datetime(int(match.group(1)), int(match.group(2)), 1)
+    leaf = match.group(3)
+    all_policies = list(policies.values())
+
+    if leaf is None:
+        return month, _shared_policy(month, all_policies, now), f"{PARENT_TABLE}/all/{month:%Y-%m}"
+    if leaf == "default":
+        # Holds rows of any platform that had no leaf of its own yet
+        return month, _shared_policy(month, all_policies, now), f"{PARENT_TABLE}/platform=default/{month:%Y-%m}"
+
+    platform_id = int(leaf[1:])
+    # Platforms without a retention_config already fall back to the env defaults
+    policy = policies.get(platform_id, retention_policy())
+    if not is_expired(month, policy, now):
+        policy = None
+    return month, policy, f"{PARENT_TABLE}/platform={platform_id}/{month:%Y-%m}"
+
+
+async def _retry_detached(engine, policies: Dict[int, Dict], now: datetime):
+    """Finishes partitions a previous cycle detached but failed to archive or drop."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND relname LIKE :prefix"
+        ), {"prefix": f"{PARENT_TABLE}\\_y%"})
+        detached = result.scalars().all()
+
+    for name in sorted(detached):
+        match = PARTITION_RE.match(name)
+        if not match:
+            continue
+        month, policy, prefix = _partition_policy(match, policies, now)
+        if policy is not None:
+            await _archive_and_drop(engine, name, policy, prefix)
+            continue
+
+        # The policy changed since it was detached, so put it back
+        if match.group(3) is None:
+            parent = PARENT_TABLE
+            bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        else:
+            parent = month_partition_name(month)
+            bounds = "DEFAULT" if match.group(3) == "default" else f"FOR VALUES IN ({int(match.group(3)[1:])})"
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f'ALTER TABLE "{parent}" ATTACH PARTITION "{name}" {bounds}'))
+            print(f"↩️ Re-attached {name}, it is no longer expired")
+        except Exception as e:
+            print(f"⚠️ Could not re-attach detached partition {name}: {e}")
+
+
+async def apply_retention(engine, now: Optional[datetime] = None):
+    """
+    Detaches and drops (optionally archiving to MinIO first) every TicketMessage
+    partition past its platform's retention window.
+    Partitions holding several platforms (flat months, _default leaves) only go once
+    the longest policy expires them, so differing per-platform windows need
+    MESSAGE_PARTITION_BY_PLATFORM=true to take effect.
+    """
+    now = now or datetime.utcnow()
+    async with engine.begin() as conn:
+        result = await conn.execute(select(Platform.id, Platform.retention_config))
+        policies = {
+            row.id: retention_policy(row.retention_config, f"platform {row.id}") for row in result
+        }
+        months = await _children(conn, PARENT_TABLE)
+
+    await _retry_detached(engine, policies, now)
+
+    for name, relkind in sorted(months.items()):
+        match = PARTITION_RE.match(name)
+        if not match:
+            continue
+
+        if relkind != "p":
+            month, policy, prefix = _partition_policy(match, policies, now)
+            if policy is not None:
+                await _expire_partition(engine, PARENT_TABLE, name, policy, prefix)
+            continue
+
+        async with engine.begin() as conn:
+            leaves = await _children(conn, name)
+
+        remaining = len(leaves)
+        for leaf in sorted(leaves):
+            leaf_match = PARTITION_RE.match(leaf)
+            if not leaf_match:
+                continue
+            month, policy, prefix = _partition_policy(leaf_match, policies, now)
+            if policy is not None and await _expire_partition(engine, name, leaf, policy, prefix):
+                remaining -= 1
+
+        month = datetime(int(match.group(1)), int(match.group(2)), 1)
+        if remaining == 0 and month < month_start(now):
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+                    await conn.execute(text(f'DROP TABLE "{name}"'))
+            except Exception as e:
+                print(f"❌ Could not drop empty partition {name}: {e}")
+
+
+async def _check_partitioned(engine) -> bool:
+    async with engine.connect() as conn:
+        if await is_partitioned(conn):
+            return True
+    print(f"⚠️ {PARENT_TABLE} is not partitioned (created before partitioning?). "
+          f"Run scripts/migrate_ticketmessage_partitions.py to enable partition maintenance.")
+    return False
+
+
+async def prepare_partitions(engine):
+    """Startup hook: only what inserts need, retention is left to the background loop."""
+    if await _check_partitioned(engine):
+        await create_future_partitions(engine)
+
+
+async def run_partition_maintenance(engine):
+    if not await _check_partitioned(engine):
+        return
+
+    await create_future_partitions(engine)
+    await apply_retention(engine)
+
+
+async def partition_maintenance_loop(engine):
+    while True:
+        try:
+            await run_partition_maintenance(engine)
+        except Exception as e:
+            print(f"❌ Partition maintenance error: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
@@ -16,7 +16,9 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 from google.cloud import pubsub_v1
 import os
+import asyncio
 from app.services.ai_service import analyze_ticket
+from app.services.partitions import prepare_partitions, partition_maintenance_loop
 
 load_dotenv()
 
@@ -49,8 +51,21 @@ async def lifespan(app: FastAPI):
     async with async_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
         print("✅ Tables created successfully")
+
+    # TicketMessage is range-partitioned by month: pre-create upcoming months now,
+    # retention (which may export whole partitions to MinIO) runs in the background
+    try:
+        await prepare_partitions(async_engine)
+    except Exception as e:
+        print(f"❌ Partition setup error: {e}")
+    maintenance_task = asyncio.create_task(partition_maintenance_loop(async_engine))
     
     yield
+    maintenance_task.cancel()
+    try:
+        await maintenance_task
+    except asyncio.CancelledError:
+        pass
     print("🛑 Shutting down...")
 
 app = FastAPI(title="Autonomous ERP Agent", lifespan=lifespan)
@@ -89,6 +104,7 @@ async def ingest_email(request: Request):
         return {"status": "skipped"}
 
     email_timestamp = email_data.get("timestamp") # We need to add this to gmail.py
+    message_ts = datetime.utcnow()
     
     if email_timestamp:
         email_dt = datetime.fromtimestamp(email_timestamp / 1000, tz=timezone.utc)
@@ -96,6 +112,9 @@ async def ingest_email(request: Request):
         if email_dt < SERVER_START_TIME:
             print(f"⏳ Skipping OLD email from {email_dt} (Server started {SERVER_START_TIME})")
             return {"status": "skipped_old"}
+
+        # Partition key for TicketMessage (naive UTC, like the other timestamps)
+        message_ts = email_dt.replace(tzinfo=None)
     
     
     if SMTP_USER in email_data["sender"]:
@@ -103,12 +122,6 @@ async def ingest_email(request: Request):
         return {"status": "ignored_self"}
  
     async with AsyncSession(async_engine, expire_on_commit=False) as session:
-        q = select(TicketMessage).where(TicketMessage.gmail_message_id == email_data["id"])
-        result = await session.execute(q)
-        if result.scalars().first():
-            print(f"🛑 SKIPPING DUPLICATE: Message {email_data['id']} already processed.")
-            return {"status": "ignored_duplicate"}
-        # Check if customer exists
         platform_email = email_data["receiver"]
         
         statement = select(Platform).where(Platform.email == platform_email)
@@ -128,6 +141,19 @@ async def ingest_email(request: Request):
             await session.commit()
             await session.refresh(platform)
 
+        # Dedupe on the partition keys too so Postgres only scans one partition
+        q = select(TicketMessage).where(
+            TicketMessage.gmail_message_id == email_data["id"],
+            TicketMessage.platform_id == platform.id
+        )
+        if email_timestamp:
+            q = q.where(TicketMessage.timestamp == message_ts)
+        result = await session.execute(q)
+        if result.scalars().first():
+            print(f"🛑 SKIPPING DUPLICATE: Message {email_data['id']} already processed.")
+            return {"status": "ignored_duplicate"}
+
+        # Check if customer exists
         statement = select(Customer).where(Customer.email == email_data["sender"])
         results = await session.execute(statement)
         customer = results.scalars().first()
@@ -154,10 +180,12 @@ async def ingest_email(request: Request):
         # 3. Save the Message (The Email Body)
         message = TicketMessage(
             ticket_id=ticket.id,
+            platform_id=platform.id,
             sender_type="customer",
             sender_email=customer.email,
             body=email_data["body"],
-            gmail_message_id=email_data["id"]
+            gmail_message_id=email_data["id"],
+            timestamp=message_ts
         )
         session.add(message)
         await session.commit()